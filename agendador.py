@@ -0,0 +1,348 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable
+
+import paramiko
+from paramiko.ssh_exception import NoValidConnectionsError
+
+from ssh import conectar_ssh
+
+# Falhas de conexão tratadas como recusa temporária do servidor (MaxStartups, sshd reiniciando, etc.):
+# reduzem os limites do host e são tentadas de novo com espera exponencial.
+RECUSAS_CONEXAO = (paramiko.SSHException, ConnectionResetError, NoValidConnectionsError)
+# Falhas que não adianta repetir: interrompem a fila inteira do host.
+ERROS_FATAIS = (paramiko.AuthenticationException, paramiko.BadHostKeyException)
+
+
+@dataclass
+class LimitesHost:
+    """
+    Limites de uso de um servidor (coletor) pelo agendador.
+
+      max_conexoes: conexões SSH simultâneas (respeite o MaxStartups do sshd).
+      max_canais: canais/sessões simultâneas por conexão (MaxSessions do sshd), contando a sessão
+                  SFTP que cada conexão do pool mantém aberta; jobs usam no máximo max_canais - 1.
+      taxa_conexao: novas conexões por segundo (token bucket).
+      rajada: quantas conexões podem ser abertas de uma vez antes de limitar a taxa.
+      max_tentativas: tentativas de conexão antes de desistir do job (e, com reenfileirar_recusas,
+                      quantas vezes um job pode voltar à fila após recusas de canal).
+      espera_inicial: espera (segundos) após a primeira recusa; dobra a cada nova recusa.
+      janela_recuperacao: jobs bem-sucedidos seguidos para voltar a subir os limites.
+    """
+    max_conexoes: int = 4
+    max_canais: int = 4
+    taxa_conexao: float = 2.0
+    rajada: int = 2
+    max_tentativas: int = 5
+    espera_inicial: float = 0.5
+    janela_recuperacao: int = 10
+
+
+class TokenBucket:
+    """Token bucket simples e thread-safe para limitar a taxa de novas conexões."""
+
+    def __init__(self, taxa: float, capacidade: int):
+        self.taxa = taxa
+        self.capacidade = max(1, capacidade)
+        self._tokens = float(self.capacidade)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _repor(self):
+        agora = time.monotonic()
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    def consumir(self):
+        """Bloqueia até haver um token disponível e o consome."""
+        while True:
+            with self._lock:
+                self._repor()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.taxa
+            time.sleep(espera)
+
+
+class _Conexao:
+    def __init__(self, client, sftp):
+        self.client = client
+        self.sftp = sftp
+        self.em_uso = 0
+
+    def ativa(self) -> bool:
+        transporte = self.client.get_transport()
+        return transporte is not None and transporte.is_active()
+
+    def fechar(self):
+        try:
+            if self.sftp:
+                self.sftp.close()
+        finally:
+            if self.client:
+                self.client.close()
+
+
+class _EstadoHost:
+    def __init__(self, limites: LimitesHost):
+        self.limites = limites
+        self.limite_conexoes = limites.max_conexoes
+        self.limite_canais = limites.max_canais
+        self.bucket = TokenBucket(limites.taxa_conexao, limites.rajada)
+        self.fila = deque()
+        self.conexoes: list[_Conexao] = []
+        self.abrindo = 0
+        self.workers = 0
+        self.ativos = 0
+        self.sucessos_seguidos = 0
+        self.erro_fatal: Exception | None = None
+        self.cond = threading.Condition()
+
+    def canais_por_conexao(self) -> int:
+        # Uma sessão de cada conexão fica ocupada pelo SFTP aberto em conectar_ssh
+        return max(1, self.limite_canais - 1)
+
+    def capacidade(self) -> int:
+        return self.limite_conexoes * self.canais_por_conexao()
+
+    def falhar_fila(self, erro: Exception):
+        """Marca o host como inutilizável e falha todos os jobs ainda enfileirados."""
+        self.erro_fatal = erro
+        while self.fila:
+            _, futuro, _ = self.fila.popleft()
+            # Jobs devolvidos à fila após recusa de canal já estão em execução
+            if futuro.running() or futuro.set_running_or_notify_cancel():
+                futuro.set_exception(erro)
+        self.cond.notify_all()
+
+    def registrar_recusa(self, canal: bool = False):
+        """Reduz os limites pela metade (AIMD) após o servidor recusar conexão ou canal."""
+        if canal:
+            self.limite_canais = max(2, self.limite_canais // 2)
+        else:
+            self.limite_conexoes = max(1, self.limite_conexoes // 2)
+            self.bucket.taxa = max(self.limites.taxa_conexao / 8, self.bucket.taxa / 2)
+        self.sucessos_seguidos = 0
+
+    def registrar_sucesso(self):
+        """Sobe os limites um passo de cada vez, até os valores configurados."""
+        self.sucessos_seguidos += 1
+        if self.sucessos_seguidos < self.limites.janela_recuperacao:
+            return
+        self.sucessos_seguidos = 0
+        if self.limite_canais < self.limites.max_canais:
+            self.limite_canais += 1
+        elif self.limite_conexoes < self.limites.max_conexoes:
+            self.limite_conexoes += 1
+        self.bucket.taxa = min(self.limites.taxa_conexao, self.bucket.taxa * 2)
+
+
+class AgendadorSSH:
+    """
+    Agenda jobs por servidor, respeitando limites de conexões, canais por conexão
+    e taxa de novas conexões. Cada job é uma função `job(ssh_client, sftp)` executada
+    sobre uma conexão reaproveitada do pool daquele host.
+
+    Quando o servidor recusa conexões (MaxStartups) ou canais (MaxSessions), os limites
+    do host são reduzidos e voltam a subir gradualmente conforme os jobs têm sucesso.
+    Falhas de autenticação ou de chave do servidor não são repetidas: falham a fila inteira do host.
+
+    Com reenfileirar_recusas=True (padrão), um job cujo canal foi recusado volta para o início da
+    fila em vez de falhar, até max_tentativas vezes. O job é executado de novo desde o começo, então
+    o que ele faz antes de abrir um canal deve poder ser repetido; use False caso contrário.
+    """
+
+    def __init__(self,
+                 usuario: str = None,
+                 senha: str = None,
+                 limites_padrao: LimitesHost | None = None,
+                 limites_por_host: dict[str, LimitesHost] | None = None,
+                 conectar: Callable = conectar_ssh,
+                 ocioso: float = 5.0,
+                 reenfileirar_recusas: bool = True):
+        self.usuario = usuario
+        self.senha = senha
+        self.limites_padrao = limites_padrao or LimitesHost()
+        self.limites_por_host = limites_por_host or {}
+        self._conectar = conectar
+        self._ocioso = ocioso
+        self.reenfileirar_recusas = reenfileirar_recusas
+        self._hosts: dict[str, _EstadoHost] = {}
+        self._lock = threading.Lock()
+        self._fechado = False
+
+    def _estado(self, host: str) -> _EstadoHost:
+        with self._lock:
+            estado = self._hosts.get(host)
+            if estado is None:
+                limites = self.limites_por_host.get(host, self.limites_padrao)
+                estado = self._hosts[host] = _EstadoHost(limites)
+            return estado
+
+    def submeter(self, host: str, job: Callable) -> Future:
+        """Enfileira um job para o host e retorna um Future com o resultado."""
+        if self._fechado:
+            raise RuntimeError("Agendador já foi encerrado.")
+        estado = self._estado(host)
+        futuro = Future()
+        with estado.cond:
+            if estado.erro_fatal is not None:
+                futuro.set_exception(estado.erro_fatal)
+                return futuro
+            estado.fila.append((job, futuro, 0))
+            if estado.workers < estado.capacidade():
+                estado.workers += 1
+                threading.Thread(target=self._worker, args=(host, estado), daemon=True).start()
+            estado.cond.notify_all()
+        return futuro
+
+    def _worker(self, host: str, estado: _EstadoHost):
+        while True:
+            with estado.cond:
+                while not estado.fila:
+                    if self._fechado or not estado.cond.wait(timeout=self._ocioso):
+                        if not estado.fila:
+                            estado.workers -= 1
+                            return
+                job, futuro, recusas = estado.fila.popleft()
+                estado.ativos += 1
+            try:
+                self._executar(host, estado, job, futuro, recusas)
+            finally:
+                with estado.cond:
+                    estado.ativos -= 1
+                    estado.cond.notify_all()
+
+    def _executar(self, host: str, estado: _EstadoHost, job: Callable, futuro: Future, recusas: int = 0):
+        if not futuro.running() and not futuro.set_running_or_notify_cancel():
+            return
+        try:
+            conexao = self._obter_canal(host, estado)
+        except Exception as err:
+            futuro.set_exception(err)
+            return
+        ok = False
+        try:
+            resultado = job(conexao.client, conexao.sftp)
+            ok = True
+        except paramiko.ChannelException as err:
+            # Servidor recusou abrir mais uma sessão nesta conexão (MaxSessions)
+            with estado.cond:
+                estado.registrar_recusa(canal=True)
+                if (self.reenfileirar_recusas and estado.erro_fatal is None
+                        and recusas + 1 < estado.limites.max_tentativas):
+                    # Volta para o início da fila; será executado quando houver canal livre no novo limite
+                    estado.fila.appendleft((job, futuro, recusas + 1))
+                    return
+            futuro.set_exception(err)
+        except Exception as err:
+            futuro.set_exception(err)
+        else:
+            futuro.set_result(resultado)
+        finally:
+            self._liberar_canal(estado, conexao, ok)
+
+    def _obter_canal(self, host: str, estado: _EstadoHost) -> _Conexao:
+        mortas = []
+        try:
+            with estado.cond:
+                while True:
+                    if estado.erro_fatal is not None:
+                        raise estado.erro_fatal
+                    # Descarta conexões cujo transporte caiu (ex: sshd reiniciado)
+                    for conexao in [c for c in estado.conexoes if c.em_uso == 0 and not c.ativa()]:
+                        estado.conexoes.remove(conexao)
+                        mortas.append(conexao)
+                    for conexao in estado.conexoes:
+                        if conexao.em_uso < estado.canais_por_conexao() and conexao.ativa():
+                            conexao.em_uso += 1
+                            return conexao
+                    if len(estado.conexoes) + estado.abrindo < estado.limite_conexoes:
+                        estado.abrindo += 1
+                        break
+                    estado.cond.wait()
+        finally:
+            for conexao in mortas:
+                conexao.fechar()
+
+        tentativas = 0
+        while True:
+            estado.bucket.consumir()
+            with estado.cond:
+                # Outro worker pode ter recebido uma falha fatal enquanto este esperava para tentar de novo
+                if estado.erro_fatal is not None:
+                    estado.abrindo -= 1
+                    estado.cond.notify_all()
+                    raise estado.erro_fatal
+            try:
+                client, sftp = self._conectar(host, self.usuario, self.senha)
+            except ERROS_FATAIS as err:
+                # Credenciais ou chave do servidor inválidas: repetir só geraria mais tentativas de login
+                with estado.cond:
+                    estado.abrindo -= 1
+                    estado.falhar_fila(err)
+                raise
+            except RECUSAS_CONEXAO:
+                tentativas += 1
+                with estado.cond:
+                    estado.registrar_recusa()
+                    if tentativas >= estado.limites.max_tentativas:
+                        estado.abrindo -= 1
+                        estado.cond.notify_all()
+                        raise
+                time.sleep(estado.limites.espera_inicial * 2 ** (tentativas - 1))
+                continue
+            except Exception:
+                with estado.cond:
+                    estado.abrindo -= 1
+                    estado.cond.notify_all()
+                raise
+            with estado.cond:
+                estado.abrindo -= 1
+                conexao = _Conexao(client, sftp)
+                conexao.em_uso = 1
+                estado.conexoes.append(conexao)
+                return conexao
+
+    def _liberar_canal(self, estado: _EstadoHost, conexao: _Conexao, ok: bool):
+        excedente = None
+        with estado.cond:
+            conexao.em_uso -= 1
+            if ok:
+                estado.registrar_sucesso()
+            # Fecha conexões ociosas que caíram ou passaram do limite atual (após recusas)
+            if conexao.em_uso == 0 and conexao in estado.conexoes and (
+                    not conexao.ativa() or len(estado.conexoes) > estado.limite_conexoes):
+                estado.conexoes.remove(conexao)
+                excedente = conexao
+            estado.cond.notify_all()
+        if excedente:
+            excedente.fechar()
+
+    def fechar(self, esperar: bool = True):
+        """Encerra o agendador e fecha todas as conexões abertas.
+        Com esperar=True, aguarda antes a conclusão dos jobs já enfileirados."""
+        with self._lock:
+            estados = list(self._hosts.values())
+        if esperar:
+            for estado in estados:
+                with estado.cond:
+                    while estado.fila or estado.ativos:
+                        estado.cond.wait()
+        self._fechado = True
+        for estado in estados:
+            with estado.cond:
+                conexoes, estado.conexoes = estado.conexoes, []
+                estado.cond.notify_all()
+            for conexao in conexoes:
+                conexao.fechar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.fechar()
@@ -0,0 +1,290 @@
+import hashlib
+import mmap
+import os
+import re
+import secrets
+import shutil
+import socket
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, escritores concorrentes não são serializados
+    fcntl = None
+
+from perfil import etapa, ativar_se_solicitado
+from main import generate_commands, get_template_paths, get_interactive_placeholder_data
+from auditoria import LogAuditoria
+from snapshots import RepositorioSnapshots
+
+ROUTER_DB_PADRAO = "~/.config/oxidized/router.db"
+
+# Linha de cabeçalho de seção, ex: "[BKP]" (espaços ao redor são ignorados, como em inserir_entrada_em_grupo)
+_RE_SECAO = re.compile(rb"^[ \t\f\v]*\[(.*)\][ \t\f\v\r]*$", re.MULTILINE)
+
+
+def sha256_conteudo(conteudo: str) -> str:
+    """SHA-256 (hex) do conteúdo como ele é gravado no arquivo (UTF-8)."""
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+class BackendArmazenamento(ABC):
+    """
+    Interface de acesso ao arquivo de configuração do Oxidized (router.db).
+    Implementações: BackendLocal (aqui) e BackendSFTP (ssh.py).
+    """
+
+    @abstractmethod
+    def ler(self, caminho: str) -> str:
+        """Retorna o conteúdo do arquivo."""
+
+    @abstractmethod
+    def salvar(self, caminho: str, conteudo: str):
+        """Substitui o conteúdo do arquivo."""
+
+    @abstractmethod
+    def inserir_entrada(self, caminho: str, nome_grupo: str, nova_entrada: str,
+                        antes_de_gravar: Callable[[str], None] | None = None):
+        """
+        Insere a nova_entrada no fim do grupo especificado. Se informado, antes_de_gravar recebe o
+        conteúdo atual do arquivo logo antes da escrita (ex: para salvar um snapshot).
+        """
+
+    @abstractmethod
+    def sha256(self, caminho: str) -> str:
+        """Retorna o SHA-256 (hex) do arquivo, calculado onde ele está armazenado."""
+
+    def verificar(self, caminho: str, sha256_esperado: str) -> bool:
+        """Confere se o arquivo tem o conteúdo esperado, sem transferi-lo."""
+        return self.sha256(caminho) == sha256_esperado
+
+
+class BackendLocal(BackendArmazenamento):
+    """
+    Acesso direto ao arquivo, para execuções no próprio host do Oxidized (sem SSH para localhost).
+
+    A inserção mapeia o arquivo em memória (mmap) para localizar a seção e procurar duplicatas sem
+    carregá-lo em strings Python. Toda escrita monta um arquivo temporário no mesmo diretório (as
+    partes inalteradas são copiadas direto do mapa) e o troca pelo original com os.replace, então uma
+    queda no meio da escrita nunca deixa o router.db pela metade. Links simbólicos são resolvidos, de
+    modo que a troca acontece no arquivo real. Se o dono do original não puder ser mantido (o arquivo
+    pertence a outro usuário), a escrita é feita no próprio arquivo, sem a garantia da troca atômica.
+    Escritores se coordenam por flock em `<arquivo>.lock`, que continua válido depois da troca do arquivo.
+    """
+
+    @staticmethod
+    def _caminho(caminho: str) -> Path:
+        # Resolve links simbólicos: a troca do arquivo precisa acontecer no alvo real, não no link
+        return Path(os.path.expanduser(caminho)).resolve()
+
+    @staticmethod
+    @contextmanager
+    def _travar(destino: Path):
+        if fcntl is None:
+            yield
+            return
+        with open(destino.with_name(destino.name + ".lock"), "a") as trava:
+            fcntl.flock(trava.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(trava.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _gravar_temporario(destino: Path, partes) -> tuple[str | None, str]:
+        """
+        Grava as partes num arquivo temporário ao lado do destino, com as permissões e o dono do
+        original, e retorna (caminho, SHA-256). O caminho é None quando o dono não pode ser mantido
+        (ex: o arquivo pertence a outro usuário); nesse caso nada fica gravado.
+        """
+        hash_arquivo = hashlib.sha256()
+        temporario = str(destino.with_name(f".{destino.name}.{os.getpid()}.{secrets.token_hex(4)}.tmp"))
+        # 0o666 com O_CREAT aplica a umask, como na criação de um arquivo comum (mkstemp usaria 0o600)
+        descritor = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            with os.fdopen(descritor, "wb") as saida:
+                for parte in partes:
+                    saida.write(parte)
+                    hash_arquivo.update(parte)
+                saida.flush()
+                os.fsync(saida.fileno())
+            if destino.exists():
+                shutil.copymode(destino, temporario)
+                original, novo = destino.stat(), os.stat(temporario)
+                if hasattr(os, "chown") and (novo.st_uid, novo.st_gid) != (original.st_uid, original.st_gid):
+                    try:
+                        os.chown(temporario, original.st_uid, original.st_gid)
+                    except PermissionError:
+                        os.unlink(temporario)
+                        return None, hash_arquivo.hexdigest()
+        except BaseException:
+            os.unlink(temporario)
+            raise
+        return temporario, hash_arquivo.hexdigest()
+
+    @staticmethod
+    def _substituir(temporario: str, destino: Path):
+        try:
+            os.replace(temporario, destino)
+        except BaseException:
+            os.unlink(temporario)
+            raise
+        # Garante que a troca de nomes também chegue ao disco (não disponível no Windows)
+        try:
+            diretorio = os.open(destino.parent, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(diretorio)
+        except OSError:
+            pass
+        finally:
+            os.close(diretorio)
+
+    @staticmethod
+    def _gravar_no_lugar(destino: Path, conteudo: bytes):
+        """Sobrescreve o próprio arquivo, mantendo inode e dono; usado só quando a troca mudaria o dono."""
+        with open(destino, "r+b") as arquivo:
+            arquivo.write(conteudo)
+            arquivo.truncate()
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+
+    @staticmethod
+    def _terminador(mapa) -> bytes:
+        """Quebra de linha usada pelo arquivo (CRLF ou LF), a partir da primeira linha."""
+        fim_linha = mapa.find(b"\n")
+        return b"\r\n" if fim_linha > 0 and mapa[fim_linha - 1:fim_linha] == b"\r" else b"\n"
+
+    def ler(self, caminho: str) -> str:
+        # Sem trava: como a escrita troca o arquivo inteiro com os.replace, a leitura vê a versão antiga ou a nova
+        try:
+            return self._caminho(caminho).read_bytes().decode("utf-8")
+        except FileNotFoundError:
+            raise Exception(f"Arquivo de configuração não encontrado: {caminho}")
+
+    def salvar(self, caminho: str, conteudo: str):
+        destino = self._caminho(caminho)
+        try:
+            with self._travar(destino):
+                dados = conteudo.encode("utf-8")
+                temporario, _ = self._gravar_temporario(destino, (dados,))
+                if temporario:
+                    self._substituir(temporario, destino)
+                else:
+                    self._gravar_no_lugar(destino, dados)
+        except Exception as err:
+            raise Exception(f"Erro ao salvar o arquivo local: {err}")
+
+    def sha256(self, caminho: str) -> str:
+        hash_arquivo = hashlib.sha256()
+        with open(self._caminho(caminho), "rb") as arquivo:
+            for bloco in iter(lambda: arquivo.read(1 << 20), b""):
+                hash_arquivo.update(bloco)
+        return hash_arquivo.hexdigest()
+
+    @etapa("inserir_entrada_local")
+    def inserir_entrada(self, caminho: str, nome_grupo: str, nova_entrada: str,
+                        antes_de_gravar: Callable[[str], None] | None = None) -> str:
+        """
+        Insere a nova_entrada no fim do grupo e retorna o SHA-256 do arquivo gravado.
+        antes_de_gravar é chamado com o conteúdo atual ainda sob a trava, então recebe exatamente
+        a versão que a escrita substitui.
+        """
+        destino = self._caminho(caminho)
+        with self._travar(destino):
+            try:
+                arquivo = open(destino, "rb")
+            except FileNotFoundError:
+                raise Exception(f"Arquivo de configuração não encontrado: {caminho}")
+            with arquivo:
+                if os.fstat(arquivo.fileno()).st_size == 0:
+                    raise Exception(f"Grupo '{nome_grupo}' não encontrado no arquivo de configuração.")
+                with mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                    inicio, fim = self._localizar_grupo(mapa, nome_grupo)
+                    terminador = self._terminador(mapa)
+                    entrada = nova_entrada.replace("\r\n", "\n").encode("utf-8").replace(b"\n", terminador)
+                    duplicada = re.compile(
+                        rb"^[ \t\f\v]*" + re.escape(entrada.strip()) + rb"[ \t\f\v\r]*$", re.MULTILINE
+                    )
+                    if duplicada.search(mapa, inicio, fim):
+                        raise Exception(f"A entrada fornecida já existe no grupo {nome_grupo}.")
+                    if antes_de_gravar:
+                        antes_de_gravar(mapa[:].decode("utf-8"))
+                    sem_quebra_final = fim > 0 and mapa[fim - 1:fim] != b"\n"
+                    insercao = (terminador if sem_quebra_final else b"") + entrada + terminador
+                    with memoryview(mapa) as visao, visao[:fim] as antes, visao[fim:] as depois:
+                        partes = (antes, insercao, depois)
+                        temporario, sha256 = self._gravar_temporario(destino, partes)
+                        if temporario is None:
+                            # Copiado antes de fechar o mapa, pois a escrita sobrescreve o próprio arquivo
+                            conteudo = b"".join(partes)
+            if temporario:
+                self._substituir(temporario, destino)
+            else:
+                self._gravar_no_lugar(destino, conteudo)
+        return sha256
+
+    @staticmethod
+    def _localizar_grupo(mapa, nome_grupo: str) -> tuple[int, int]:
+        """Retorna (início do corpo, fim) da seção em bytes; o fim é o início do próximo cabeçalho ou o fim do arquivo."""
+        inicio = None
+        for secao in _RE_SECAO.finditer(mapa):
+            if inicio is None:
+                nome = secao.group(1).decode("utf-8", errors="replace").strip()
+                if nome.lower() == nome_grupo.lower():
+                    fim_linha = mapa.find(b"\n", secao.end())
+                    inicio = len(mapa) if fim_linha == -1 else fim_linha + 1
+            else:
+                return inicio, secao.start()
+        if inicio is None:
+            raise Exception(f"Grupo '{nome_grupo}' não encontrado no arquivo de configuração.")
+        return inicio, len(mapa)
+
+
+# Execução direta no host do Oxidized:
+if __name__ == "__main__":
+    ativar_se_solicitado()
+    caminho_config = input(f"Caminho do router.db local (ENTER para {ROUTER_DB_PADRAO}): ").strip() or ROUTER_DB_PADRAO
+    nome_grupo = input("Nome do grupo/seção no arquivo de configuração (ex: BKP): ").strip() or "BKP"
+
+    templates = get_template_paths()
+    print("Templates disponíveis:")
+    for i, p in enumerate(templates, 1):
+        print(f"{i}) {p.name}")
+    try:
+        main_template_idx = int(input("Nº do template: ").strip()) - 1
+        if not (0 <= main_template_idx < len(templates)):
+            raise ValueError("Índice inválido.")
+    except ValueError:
+        raise SystemExit("Escolha de template inválida.")
+
+    placeholder_data = get_interactive_placeholder_data([templates[main_template_idx]])
+    nova_entrada = "\n".join(generate_commands(main_template_idx, "n", None, placeholder_data))
+
+    print("\n--- Entradas Geradas para Inserção ---")
+    print(nova_entrada)
+    if input("\nConfirmar inserção destas entradas? [S/N]: ").strip().lower() == 's':
+        # Importado aqui: recarga.py depende de ssh.py, que importa este módulo
+        from recarga import RecarregadorOxidized, eh_router_db, executar_local
+
+        backend = BackendLocal()
+        host_local = socket.gethostname()
+        snapshots = RepositorioSnapshots()
+        sha256_esperado = backend.inserir_entrada(
+            caminho_config, nome_grupo, nova_entrada,
+            antes_de_gravar=lambda conteudo: snapshots.salvar(host_local, caminho_config, conteudo),
+        )
+        if not backend.verificar(caminho_config, sha256_esperado):
+            raise SystemExit(f"ATENÇÃO: checksum do arquivo não confere após a escrita: {caminho_config}")
+        LogAuditoria().registrar(host_local, caminho_config, nome_grupo, nova_entrada)
+        print(f"Novas entradas inseridas no grupo '{nome_grupo}' e arquivo salvo com sucesso.")
+        if eh_router_db(caminho_config):
+            recarregador = RecarregadorOxidized(executar=executar_local)
+            recarregador.notificar_escrita(host_local, None, None)
+            recarregador.fechar()
+    else:
+        print("Inserção cancelada.")
@@ -0,0 +1,219 @@
+import getpass
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, os registros não são travados
+    fcntl = None
+
+BASE = Path(__file__).resolve().parent
+AUDITORIA_DIR = BASE / "auditoria"
+
+CAMPOS = ("timestamp", "host", "caminho", "grupo", "entrada", "operador")
+_SEPARADOR = "\x1f"
+# Cabeçalho de cada registro: marcador, tamanho e CRC32 dos dados. Se uma escrita for interrompida,
+# o leitor detecta o registro truncado pelo CRC e volta a sincronizar no próximo marcador.
+_MARCADOR = b"\xb4Aud"
+_CABECALHO = struct.Struct(">4sII")
+_ENTRADA_INDICE = struct.Struct(">QQ")  # hash da chave, offset do registro no log
+_BUCKETS = 256
+# Campos de uma linha do router.db gravados no log; os demais são credenciais do dispositivo
+_CAMPOS_PUBLICOS = 5
+
+
+def _hash_chave(chave: str) -> int:
+    return int.from_bytes(hashlib.blake2b(chave.strip().lower().encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _chaves_da_entrada(entrada: str) -> set[str]:
+    """Extrai nome do dispositivo e IP de cada linha no formato do router.db (NOME:IP:modelo:grupo:...)."""
+    chaves = set()
+    for linha in entrada.splitlines():
+        campos = linha.strip().split(":")
+        chaves.update(c.strip().lower() for c in campos[:2] if c.strip())
+    return chaves
+
+
+def _ocultar_credenciais(entrada: str) -> str:
+    """Mantém apenas nome:ip:modelo:grupo:porta de cada linha; os campos seguintes (usuário, senha) viram "***"."""
+    linhas = []
+    for linha in entrada.splitlines():
+        campos = linha.split(":")
+        linhas.append(":".join(campos[:_CAMPOS_PUBLICOS] + ["***"] * len(campos[_CAMPOS_PUBLICOS:])))
+    return "\n".join(linhas)
+
+
+class LogAuditoria:
+    """
+    Log local, somente de acréscimo, das inserções feitas no router.db.
+
+    Cada registro é gravado em `insercoes.log` com marcador, tamanho e CRC32, de modo que um registro
+    truncado por uma escrita interrompida é ignorado sem afetar os seguintes. Um índice lateral por nome
+    do dispositivo e IP é dividido em 256 arquivos de entradas fixas (hash da chave, offset), então
+    uma busca lê só o bucket da chave e os registros encontrados, mesmo com milhões de registros.
+    O índice pode ser reconstruído a partir do log a qualquer momento.
+    """
+
+    def __init__(self, diretorio: Path | str = None):
+        self.diretorio = Path(diretorio or os.getenv("AUDIT_DIR") or AUDITORIA_DIR)
+        self.caminho_log = self.diretorio / "insercoes.log"
+        self.dir_indice = self.diretorio / "indice"
+
+    def _caminho_bucket(self, hash_chave: int) -> Path:
+        return self.dir_indice / f"{hash_chave % _BUCKETS:02x}.idx"
+
+    @contextmanager
+    def _travar_log(self):
+        """Abre o log para acréscimo com trava exclusiva; serializa escritas no log e no índice."""
+        self.dir_indice.mkdir(parents=True, exist_ok=True)
+        with open(self.caminho_log, "ab") as log:
+            if fcntl:
+                fcntl.flock(log.fileno(), fcntl.LOCK_EX)
+            try:
+                yield log
+            finally:
+                if fcntl:
+                    fcntl.flock(log.fileno(), fcntl.LOCK_UN)
+
+    def _indexar(self, offset: int, entrada: str):
+        for chave in _chaves_da_entrada(entrada):
+            hash_chave = _hash_chave(chave)
+            with open(self._caminho_bucket(hash_chave), "ab") as bucket:
+                # Descarta uma entrada de índice incompleta deixada por uma escrita interrompida
+                tamanho = bucket.seek(0, os.SEEK_END)
+                if tamanho % _ENTRADA_INDICE.size:
+                    bucket.truncate(tamanho - tamanho % _ENTRADA_INDICE.size)
+                bucket.write(_ENTRADA_INDICE.pack(hash_chave, offset))
+
+    def registrar(self, host: str, caminho: str, grupo: str, entrada: str, operador: str = None) -> dict:
+        """Acrescenta um registro de inserção ao log e ao índice. As credenciais da entrada não são gravadas."""
+        registro = {
+            "timestamp": int(time.time()),
+            "host": host,
+            "caminho": caminho,
+            "grupo": grupo,
+            "entrada": _ocultar_credenciais(entrada),
+            "operador": operador or getpass.getuser(),
+        }
+        dados = _SEPARADOR.join(str(registro[c]).replace(_SEPARADOR, " ") for c in CAMPOS).encode("utf-8")
+        with self._travar_log() as log:
+            offset = log.seek(0, os.SEEK_END)
+            log.write(_CABECALHO.pack(_MARCADOR, len(dados), zlib.crc32(dados)) + dados)
+            log.flush()
+            self._indexar(offset, entrada)
+        return registro
+
+    @staticmethod
+    def _decodificar(dados: bytes) -> dict:
+        registro = dict(zip(CAMPOS, dados.decode("utf-8").split(_SEPARADOR)))
+        registro["timestamp"] = int(registro["timestamp"])
+        return registro
+
+    @staticmethod
+    def _registro_em(mapa, offset: int) -> tuple[dict, int] | None:
+        """Decodifica o registro que começa em offset e retorna (registro, fim); None se estiver truncado ou corrompido."""
+        if offset + _CABECALHO.size > len(mapa):
+            return None
+        marcador, tamanho, crc = _CABECALHO.unpack_from(mapa, offset)
+        inicio = offset + _CABECALHO.size
+        fim = inicio + tamanho
+        if marcador != _MARCADOR or fim > len(mapa):
+            return None
+        dados = mapa[inicio:fim]
+        if zlib.crc32(dados) != crc:
+            return None
+        return LogAuditoria._decodificar(dados), fim
+
+    def _mapear_log(self):
+        if not self.caminho_log.exists() or self.caminho_log.stat().st_size == 0:
+            return None
+        with open(self.caminho_log, "rb") as log:
+            return mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _percorrer(self):
+        """Gera (offset, registro) de todos os registros válidos do log, em ordem, pulando trechos corrompidos."""
+        mapa = self._mapear_log()
+        if mapa is None:
+            return
+        with mapa:
+            offset = 0
+            while offset < len(mapa):
+                lido = self._registro_em(mapa, offset)
+                if lido is None:
+                    # Registro truncado (escrita interrompida): ressincroniza no próximo marcador
+                    offset = mapa.find(_MARCADOR, offset + 1)
+                    if offset == -1:
+                        return
+                    continue
+                registro, fim = lido
+                yield offset, registro
+                offset = fim
+
+    def buscar(self, chave: str) -> list[dict]:
+        """Retorna os registros cuja entrada contém o nome de dispositivo ou IP informado, em ordem cronológica."""
+        hash_chave = _hash_chave(chave)
+        bucket = self._caminho_bucket(hash_chave)
+        if not bucket.exists():
+            return []
+        dados = bucket.read_bytes()
+        dados = dados[:len(dados) - len(dados) % _ENTRADA_INDICE.size]
+        offsets = sorted({off for h, off in _ENTRADA_INDICE.iter_unpack(dados) if h == hash_chave})
+        resultados = []
+        mapa = self._mapear_log()
+        if mapa is None:
+            return []
+        with mapa:
+            for offset in offsets:
+                lido = self._registro_em(mapa, offset)
+                # Descarta registros corrompidos e colisões de hash
+                if lido and chave.strip().lower() in _chaves_da_entrada(lido[0]["entrada"]):
+                    resultados.append(lido[0])
+        return resultados
+
+    def reconstruir_indice(self):
+        """Recria o índice lateral a partir do log (ex: após uma escrita interrompida)."""
+        # A trava do log impede que um registrar() concorrente indexe num bucket prestes a ser apagado
+        with self._travar_log():
+            for bucket in self.dir_indice.glob("*.idx"):
+                bucket.unlink()
+            for offset, registro in self._percorrer():
+                self._indexar(offset, registro["entrada"])
+
+    def exportar_jsonl(self, destino: Path | str) -> int:
+        """Exporta todos os registros como JSON lines e retorna quantos foram exportados."""
+        total = 0
+        with open(destino, "w", encoding="utf-8") as saida:
+            for _, registro in self._percorrer():
+                saida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                total += 1
+        return total
+
+
+if __name__ == "__main__":
+    auditoria = LogAuditoria()
+    print("1) Buscar por nome do dispositivo ou IP")
+    print("2) Exportar log como JSON lines")
+    choice = input("Sua escolha: ").strip()
+
+    if choice == '1':
+        chave = input("Nome do dispositivo ou IP: ").strip()
+        registros = auditoria.buscar(chave)
+        if not registros:
+            print("Nenhum registro encontrado.")
+        for r in registros:
+            quando = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r["timestamp"]))
+            print(f"{quando}  {r['operador']}@{r['host']}  {r['caminho']} [{r['grupo']}]")
+            print(f"    {r['entrada']}")
+    elif choice == '2':
+        destino = input("Arquivo de destino (ENTER para auditoria.jsonl): ").strip() or "auditoria.jsonl"
+        print(f"{auditoria.exportar_jsonl(destino)} registro(s) exportado(s) para {destino}.")
+    else:
+        print("Opção inválida.")
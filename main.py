@@ -1,6 +1,9 @@
 from pathlib import Path
 import sys
 import re
+from typing import Iterable
+
+from perfil import etapa, ativar_se_solicitado
 
 BASE = Path(__file__).resolve().parent
 TEMPLATES_DIR = BASE / "data"
@@ -18,10 +21,45 @@ def get_template_paths():
         raise SystemExit(f"Nenhum template .txt encontrado em {TEMPLATES_DIR}/")
     return arquivos
 
+@etapa("render_template")
 def render_template(path: Path, data: dict) -> str:
     txt = path.read_text(encoding="utf-8")
     return txt.format_map(SafeDict(data))
 
+def get_template_sets() -> dict[str, list[Path]]:
+    """Groups available templates into named sets by client prefix (e.g. "CCS" -> CCS-Cisco.txt, CCS-Mkt.txt)."""
+    sets = {}
+    for path in get_template_paths():
+        prefix = path.stem.split("-", 1)[0]
+        sets.setdefault(prefix, []).append(path)
+    return sets
+
+@etapa("render_templates")
+def render_templates(template_paths: list[Path], data: dict | Iterable[dict]) -> dict[Path, list[str]]:
+    """
+    Renders any number of templates against one placeholder dict or a stream of rows (dicts) in a single pass.
+    Each template is read only once. Returns the non-empty command lines grouped per template,
+    in the order the templates were given.
+    """
+    rows = (data,) if isinstance(data, dict) else data
+    texts = {path: path.read_text(encoding="utf-8") for path in template_paths}
+    outputs = {path: [] for path in texts}
+    for row in rows:
+        mapping = SafeDict(row)
+        for path, txt in texts.items():
+            outputs[path].extend(cmd.strip() for cmd in txt.format_map(mapping).splitlines() if cmd.strip())
+    return outputs
+
+def generate_set_commands(set_name: str, data: dict | Iterable[dict]) -> dict[Path, list[str]]:
+    """Generates commands for every template of a named set (see get_template_sets), grouped per template."""
+    sets = {name.lower(): paths for name, paths in get_template_sets().items()}
+    try:
+        template_paths = sets[set_name.lower()]
+    except KeyError:
+        raise ValueError(f"Conjunto de templates inválido: {set_name}")
+    return render_templates(template_paths, data)
+
+@etapa("get_placeholder_names")
 def get_placeholder_names(template_paths: list[Path]) -> list[str]:
     """Extracts and returns a sorted list of unique placeholder names from given templates."""
     all_placeholders = set()
@@ -91,18 +129,10 @@ def generate_commands(
         except IndexError:
             pass # Invalid index, just ignore aggregated template
 
-    rendered_outputs = []
-    saida_principal = render_template(tpl_principal, placeholder_data)
-    rendered_outputs.append(saida_principal)
-
-    if tpl_sec:
-        saida_sec = render_template(tpl_sec, placeholder_data)
-        rendered_outputs.append(saida_sec)
-
-    # Split each rendered output by newline and filter empty lines
+    selected = [tpl_principal] + ([tpl_sec] if tpl_sec else [])
     all_commands = []
-    for output_block in rendered_outputs:
-        all_commands.extend([cmd.strip() for cmd in output_block.splitlines() if cmd.strip()])
+    for commands in render_templates(selected, placeholder_data).values():
+        all_commands.extend(commands)
     return all_commands
 
 def _interactive_main():
@@ -154,4 +184,5 @@ def _interactive_main():
 
 
 if __name__ == "__main__":
+    ativar_se_solicitado()
     _interactive_main()
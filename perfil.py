@@ -0,0 +1,214 @@
+import atexit
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ContextDecorator
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parent
+PERFIS_DIR = BASE / "perfis"
+TOP_N = 20
+
+_perfilador = None
+# Código das funções marcadas com @etapa, usado para atribuir as alocações do snapshot final a cada etapa
+_codigos: dict[str, list] = {}
+# Quadros guardados por alocação: suficiente para chegar da linha que alocou até a função da etapa
+_QUADROS = 16
+
+
+class _Etapa:
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.profile = cProfile.Profile()
+        self.chamadas = 0
+        self.tempo = 0.0
+        self.liquido = 0
+        self.pico = 0
+
+
+class _Perfilador:
+    """
+    Mantém um cProfile por etapa e mede, a cada chamada, a memória líquida e o pico (tracemalloc)
+    com get_traced_memory()/reset_peak(), que custam O(1). O detalhamento por linha vem de um único
+    snapshot no fim da execução.
+    """
+
+    def __init__(self, diretorio: Path, top: int):
+        self.diretorio = diretorio
+        self.top = top
+        self.thread = threading.get_ident()
+        self.etapas: dict[str, _Etapa] = {}
+        # Cada quadro: [etapa, início, memória na entrada, maior pico visto até agora]
+        self.pilha = []
+
+    def _atualizar_pico(self, quadro):
+        quadro[3] = max(quadro[3], tracemalloc.get_traced_memory()[1])
+
+    def entrar(self, nome: str):
+        etapa = self.etapas.get(nome)
+        if etapa is None:
+            etapa = self.etapas[nome] = _Etapa(nome)
+        # Só um profiler pode estar ativo por vez: a etapa externa pausa enquanto a interna roda,
+        # então o cProfile de cada etapa mede apenas o tempo gasto fora das etapas aninhadas.
+        if self.pilha:
+            self.pilha[-1][0].profile.disable()
+            # O pico da etapa externa até aqui é guardado antes de zerá-lo para a etapa interna
+            self._atualizar_pico(self.pilha[-1])
+        tracemalloc.reset_peak()
+        atual = tracemalloc.get_traced_memory()[0]
+        self.pilha.append([etapa, time.perf_counter(), atual, atual])
+        etapa.chamadas += 1
+        etapa.profile.enable()
+
+    def sair(self):
+        quadro = self.pilha.pop()
+        etapa, inicio, memoria_entrada, _ = quadro
+        etapa.profile.disable()
+        etapa.tempo += time.perf_counter() - inicio
+        self._atualizar_pico(quadro)
+        etapa.liquido += tracemalloc.get_traced_memory()[0] - memoria_entrada
+        etapa.pico = max(etapa.pico, quadro[3] - memoria_entrada)
+        if self.pilha:
+            # O pico da etapa interna também conta para a externa
+            self.pilha[-1][3] = max(self.pilha[-1][3], quadro[3])
+            self.pilha[-1][0].profile.enable()
+
+    @staticmethod
+    def _alocacoes_por_etapa(snapshot: tracemalloc.Snapshot) -> dict[str, Counter]:
+        """Atribui cada alocação viva à etapa cuja função aparece na sua pilha de chamadas."""
+        faixas: dict[str, list] = {}
+        for nome, codigos in _codigos.items():
+            for codigo in codigos:
+                linhas = [linha for _, _, linha in codigo.co_lines() if linha]
+                faixas.setdefault(codigo.co_filename, []).append((nome, min(linhas), max(linhas)))
+        alocacoes = {"execucao": Counter()}
+        for trace in snapshot.traces:
+            # Traceback vai do quadro mais antigo ao mais recente: o último é a linha que alocou
+            local = str(trace.traceback[-1])
+            alocacoes["execucao"][local] += trace.size
+            etapas = {nome for frame in trace.traceback for nome, inicio, fim in faixas.get(frame.filename, ())
+                      if inicio <= frame.lineno <= fim}
+            for nome in etapas:
+                alocacoes.setdefault(nome, Counter())[local] += trace.size
+        return alocacoes
+
+    def finalizar(self):
+        while self.pilha:
+            self.sair()
+        alocacoes = {}
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ))
+            tracemalloc.stop()
+            alocacoes = self._alocacoes_por_etapa(snapshot)
+
+        destino = self.diretorio / time.strftime("perfil-%Y%m%d-%H%M%S")
+        destino.mkdir(parents=True, exist_ok=True)
+        completo = None
+        resumo = io.StringIO()
+        for etapa in sorted(self.etapas.values(), key=lambda e: e.tempo, reverse=True):
+            stats = pstats.Stats(etapa.profile, stream=resumo)
+            stats.dump_stats(destino / f"{etapa.nome}.prof")
+            if completo is None:
+                completo = pstats.Stats(etapa.profile)
+            else:
+                completo.add(etapa.profile)
+
+            resumo.write(f"=== {etapa.nome}: {etapa.chamadas} chamada(s), {etapa.tempo:.3f}s (inclui etapas aninhadas) ===\n")
+            if alocacoes:
+                resumo.write(f"Memória: pico máximo {etapa.pico / 1024:.1f} KiB por chamada, "
+                             f"líquido {etapa.liquido / 1024:.1f} KiB no total\n")
+            stats.sort_stats("cumulative").print_stats(self.top)
+            if alocacoes:
+                resumo.write(f"--- Alocações ainda vivas no fim da execução, por linha (top {self.top}) ---\n")
+                for local, tamanho in alocacoes.get(etapa.nome, Counter()).most_common(self.top):
+                    resumo.write(f"{tamanho / 1024:10.1f} KiB  {local}\n")
+            resumo.write("\n")
+        if completo is not None:
+            completo.dump_stats(destino / "completo.prof")
+        (destino / "resumo.txt").write_text(resumo.getvalue(), encoding="utf-8")
+        print(f"Perfil de CPU e memória salvo em {destino}", file=sys.stderr)
+
+
+class etapa(ContextDecorator):
+    """
+    Marca uma etapa do pipeline para o perfil, como context manager ou decorator:
+
+        @etapa("render_template")
+        def render_template(...): ...
+
+    Sem perfil ativo (ou fora da thread que o ativou) não faz nada.
+    """
+
+    def __init__(self, nome: str):
+        self.nome = nome
+
+    def __call__(self, funcao):
+        _codigos.setdefault(self.nome, []).append(funcao.__code__)
+        return super().__call__(funcao)
+
+    def _perfilador(self):
+        if _perfilador is not None and _perfilador.thread == threading.get_ident():
+            return _perfilador
+        return None
+
+    def __enter__(self):
+        perfilador = self._perfilador()
+        if perfilador:
+            perfilador.entrar(self.nome)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        perfilador = self._perfilador()
+        if perfilador and perfilador.pilha:
+            perfilador.sair()
+        return False
+
+
+def ativar(diretorio: Path | str = None, top: int = TOP_N, memoria: bool = True):
+    """
+    Liga o cProfile (e o tracemalloc, se memoria=True) até o fim do processo; o tempo fora de etapas
+    marcadas vai para "execucao". O tracemalloc deixa alocações bem mais lentas, então desligue-o
+    quando o objetivo for só medir tempo.
+    """
+    global _perfilador
+    if _perfilador is not None:
+        return
+    if memoria:
+        tracemalloc.start(_QUADROS)
+    _perfilador = _Perfilador(Path(diretorio or PERFIS_DIR), top)
+    _perfilador.entrar("execucao")
+    atexit.register(_perfilador.finalizar)
+
+
+def ativar_se_solicitado(argv: list[str] = None) -> bool:
+    """
+    Ativa o perfil se a linha de comando tiver `--profile` (ou `--profile=DIR`) ou se a variável
+    de ambiente BKPS_PROFILE estiver definida (com o diretório de saída, ou "1" para o padrão).
+    BKPS_PROFILE_MEM=0 desliga a medição de memória.
+    A flag é removida de argv.
+    """
+    argv = sys.argv if argv is None else argv
+    diretorio = None
+    solicitado = False
+    for arg in list(argv[1:]):
+        if arg == "--profile" or arg.startswith("--profile="):
+            solicitado = True
+            diretorio = arg.partition("=")[2] or None
+            argv.remove(arg)
+    ambiente = os.getenv("BKPS_PROFILE")
+    if ambiente:
+        solicitado = True
+        diretorio = diretorio or (None if ambiente == "1" else ambiente)
+    if solicitado:
+        top = int(os.getenv("BKPS_PROFILE_TOP", TOP_N))
+        ativar(diretorio, top, memoria=os.getenv("BKPS_PROFILE_MEM", "1") != "0")
+    return solicitado
@@ -0,0 +1,133 @@
+import os
+import posixpath
+import subprocess
+import threading
+import time
+from typing import Callable
+
+from ssh import execute_sudo_command
+
+# Comando executado (com sudo) no coletor depois de alterar o router.db.
+# Pode ser sobrescrito no .env, ex: OXIDIZED_RELOAD_CMD="curl -s http://127.0.0.1:8888/reload"
+COMANDO_RECARGA_PADRAO = "systemctl restart oxidized"
+JANELA_PADRAO = 10.0
+# router.db lido pelo Oxidized no coletor, relativo ao home do usuário SSH (ou absoluto).
+# Pode ser sobrescrito no .env com OXIDIZED_ROUTER_DB.
+ROUTER_DB_PADRAO = ".config/oxidized/router.db"
+
+
+def _normalizar_caminho_remoto(caminho: str) -> str:
+    caminho = caminho.strip().strip("'\"")
+    for prefixo in ("~/", "$HOME/", "${HOME}/"):
+        if caminho.startswith(prefixo):
+            caminho = caminho[len(prefixo):]
+            break
+    return posixpath.normpath(caminho)
+
+
+def eh_router_db(caminho: str) -> bool:
+    """
+    Indica se o caminho remoto é o router.db do Oxidized, o único arquivo cuja alteração exige recarga.
+    Aceita as formas relativa, com "~/" ou "$HOME/" e absoluta (ex: /home/usuario/.config/oxidized/router.db).
+    """
+    if not caminho or not caminho.strip():
+        return False
+    configurado = _normalizar_caminho_remoto(os.getenv("OXIDIZED_ROUTER_DB") or ROUTER_DB_PADRAO)
+    informado = _normalizar_caminho_remoto(caminho)
+    if informado == configurado:
+        return True
+    # Caminho relativo ao home configurado, informado na forma absoluta
+    return not posixpath.isabs(configurado) and informado.endswith("/" + configurado)
+
+
+def executar_local(ssh_client, comando: str, senha_sudo: str = None):
+    """
+    Executor para rodar no próprio coletor (ex: armazenamento.py), com a mesma assinatura de
+    execute_sudo_command. Usa sudo quando não está rodando como root; o sudo pede a senha no terminal.
+    """
+    argv = ["sh", "-c", comando]
+    if hasattr(os, "geteuid") and os.geteuid() != 0:
+        argv = ["sudo"] + argv
+    try:
+        resultado = subprocess.run(argv, capture_output=True, text=True)
+    except OSError as e:
+        print(f"Erro ao executar comando local: {e}")
+        return "", str(e), 1
+    if resultado.returncode != 0:
+        print(f"Comando '{comando}' falhou com código {resultado.returncode}.")
+        print(f"Erro:\n{resultado.stderr.strip()}")
+    return resultado.stdout.strip(), resultado.stderr.strip(), resultado.returncode
+
+
+class _Pendente:
+    def __init__(self, ssh_client, senha_sudo: str):
+        self.ssh_client = ssh_client
+        self.senha_sudo = senha_sudo
+        self.primeira_escrita = time.monotonic()
+        self.escritas = 0
+        self.timer: threading.Timer | None = None
+
+
+class RecarregadorOxidized:
+    """
+    Estágio pós-escrita que recarrega o Oxidized uma única vez por host depois de um lote de escritas.
+
+    Cada chamada a `notificar_escrita` reinicia a janela de espera do host; quando a janela
+    termina sem novas escritas, o comando de recarga é executado uma vez. Para que um fluxo
+    contínuo de escritas não adie a recarga para sempre, ela é forçada após `espera_maxima`
+    segundos da primeira escrita pendente.
+    """
+
+    def __init__(self,
+                 comando: str = None,
+                 janela: float = None,
+                 espera_maxima: float = None,
+                 executar: Callable = execute_sudo_command):
+        self.comando = comando or os.getenv("OXIDIZED_RELOAD_CMD") or COMANDO_RECARGA_PADRAO
+        self.janela = janela if janela is not None else float(os.getenv("OXIDIZED_RELOAD_WINDOW", JANELA_PADRAO))
+        self.espera_maxima = espera_maxima if espera_maxima is not None else self.janela * 6
+        self._executar = executar
+        self._pendentes: dict[str, _Pendente] = {}
+        self._lock = threading.Lock()
+
+    def notificar_escrita(self, host: str, ssh_client, senha_sudo: str):
+        """Registra uma escrita no host e agenda (ou adia) a recarga do Oxidized."""
+        with self._lock:
+            pendente = self._pendentes.get(host)
+            if pendente is None:
+                pendente = self._pendentes[host] = _Pendente(ssh_client, senha_sudo)
+            pendente.escritas += 1
+            if pendente.timer:
+                pendente.timer.cancel()
+            decorrido = time.monotonic() - pendente.primeira_escrita
+            espera = max(0.0, min(self.janela, self.espera_maxima - decorrido))
+            pendente.timer = threading.Timer(espera, self._recarregar, args=(host,))
+            pendente.timer.daemon = True
+            pendente.timer.start()
+
+    def _recarregar(self, host: str):
+        with self._lock:
+            pendente = self._pendentes.pop(host, None)
+            if pendente is None:
+                return None
+            if pendente.timer:
+                pendente.timer.cancel()
+        print(f"Recarregando Oxidized em {host} após {pendente.escritas} escrita(s)...")
+        return self._executar(pendente.ssh_client, self.comando, pendente.senha_sudo)
+
+    def descarregar(self, host: str = None):
+        """Executa imediatamente as recargas pendentes (de um host ou de todos)."""
+        with self._lock:
+            hosts = [host] if host else list(self._pendentes)
+        for h in hosts:
+            self._recarregar(h)
+
+    def fechar(self):
+        """Executa as recargas pendentes; chame antes de encerrar as conexões SSH."""
+        self.descarregar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.fechar()
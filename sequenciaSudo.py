@@ -109,6 +109,9 @@ def run_commands_with_sudo(ssh_client: paramiko.SSHClient,
             if rc != 0 and stop_on_error:
                 raise RuntimeError(f"Comando falhou (rc={rc}): {cmd}\nstderr: {erro_texto}")
 
+        except paramiko.ChannelException:
+            # Recusa de canal (MaxSessions) é repassada sem embrulhar, para quem controla a concorrência
+            raise
         except paramiko.SSHException as e:
             # Erros relacionados ao SSH/execução do canal
             raise RuntimeError(f"Erro SSH ao executar '{cmd}': {e}") from e
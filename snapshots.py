@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import time
+import zlib
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parent
+SNAPSHOTS_DIR = BASE / "snapshots"
+
+# Um chunk termina após a linha cujo CRC32 é múltiplo deste valor (~16 linhas por chunk, em média).
+# Como a fronteira depende só do conteúdo da linha, inserir uma entrada altera apenas o chunk onde
+# ela caiu; os demais continuam idênticos e não são gravados de novo.
+DIVISOR_CHUNK = 16
+MAX_LINHAS_CHUNK = 256
+
+
+def _dividir_em_chunks(conteudo: str) -> list[str]:
+    """Divide o conteúdo em chunks de linhas com fronteiras definidas pelo próprio conteúdo."""
+    chunks = []
+    atual = []
+    for linha in conteudo.splitlines(keepends=True):
+        atual.append(linha)
+        fronteira = zlib.crc32(linha.encode("utf-8")) % DIVISOR_CHUNK == 0
+        if fronteira or len(atual) >= MAX_LINHAS_CHUNK:
+            chunks.append("".join(atual))
+            atual = []
+    if atual:
+        chunks.append("".join(atual))
+    return chunks
+
+
+def _agrupar_chaves(chaves: list[str]) -> list[list[str]]:
+    """Agrupa chaves de objetos em nós da árvore, com fronteiras definidas pelo valor das chaves."""
+    grupos = []
+    atual = []
+    for chave in chaves:
+        atual.append(chave)
+        if int(chave[:8], 16) % DIVISOR_CHUNK == 0 or len(atual) >= MAX_LINHAS_CHUNK:
+            grupos.append(atual)
+            atual = []
+    if atual or not grupos:
+        grupos.append(atual)
+    return grupos
+
+
+class RepositorioSnapshots:
+    """
+    Repositório local de versões anteriores de arquivos remotos (ex: router.db), por host/caminho.
+
+    Cada versão é gravada como uma árvore de chunks endereçados pelo SHA-256 e comprimidos com zlib;
+    chunks e nós repetidos entre versões são armazenados uma única vez, então uma nova versão custa
+    apenas o chunk alterado e os nós no caminho até a raiz. O histórico de cada host/caminho
+    fica num índice JSON lines próprio, então listar versões não exige abrir os objetos.
+    """
+
+    def __init__(self, diretorio: Path | str = None):
+        self.diretorio = Path(diretorio or os.getenv("SNAPSHOT_DIR") or SNAPSHOTS_DIR)
+        self.objetos = self.diretorio / "objetos"
+        self.indices = self.diretorio / "indices"
+
+    def _caminho_objeto(self, chave: str) -> Path:
+        return self.objetos / chave[:2] / chave[2:]
+
+    def _gravar_objeto(self, dados: bytes) -> str:
+        chave = hashlib.sha256(dados).hexdigest()
+        destino = self._caminho_objeto(chave)
+        if not destino.exists():
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            temporario = destino.with_suffix(".tmp")
+            temporario.write_bytes(zlib.compress(dados, 9))
+            os.replace(temporario, destino)
+        return chave
+
+    def _ler_objeto(self, chave: str) -> bytes:
+        try:
+            dados = zlib.decompress(self._caminho_objeto(chave).read_bytes())
+        except FileNotFoundError:
+            raise Exception(f"Objeto do snapshot não encontrado: {chave}")
+        if hashlib.sha256(dados).hexdigest() != chave:
+            raise Exception(f"Objeto do snapshot corrompido: {chave}")
+        return dados
+
+    def _gravar_arvore(self, conteudo: str) -> str:
+        """Grava o conteúdo como árvore de objetos e retorna a chave do nó raiz.
+        Cada nó é "<nível>" seguido das chaves dos filhos, uma por linha; no nível 0 os filhos são chunks."""
+        chaves = [self._gravar_objeto(c.encode("utf-8")) for c in _dividir_em_chunks(conteudo)]
+        nivel = 0
+        while True:
+            nos = [self._gravar_objeto("\n".join([str(nivel)] + grupo).encode("utf-8"))
+                   for grupo in _agrupar_chaves(chaves)]
+            if len(nos) == 1:
+                return nos[0]
+            chaves = nos
+            nivel += 1
+
+    def _ler_arvore(self, chave: str):
+        linhas = self._ler_objeto(chave).decode("utf-8").split("\n")
+        nivel, filhos = int(linhas[0]), linhas[1:]
+        for filho in filhos:
+            if nivel == 0:
+                yield self._ler_objeto(filho)
+            else:
+                yield from self._ler_arvore(filho)
+
+    def _caminho_indice(self, host: str, caminho: str) -> Path:
+        chave = hashlib.sha256(f"{host}\0{caminho}".encode("utf-8")).hexdigest()[:32]
+        return self.indices / f"{chave}.jsonl"
+
+    def salvar(self, host: str, caminho: str, conteudo: str) -> str:
+        """Grava uma versão do conteúdo e retorna seu identificador.
+        Se o conteúdo for igual ao da última versão, nada é gravado."""
+        versao = self._gravar_arvore(conteudo)
+
+        historico = self.listar(host, caminho)
+        if historico and historico[-1]["versao"] == versao:
+            return versao
+
+        registro = {
+            "versao": versao,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "tamanho": len(conteudo.encode("utf-8")),
+            "host": host,
+            "caminho": caminho,
+        }
+        indice = self._caminho_indice(host, caminho)
+        indice.parent.mkdir(parents=True, exist_ok=True)
+        with open(indice, "a", encoding="utf-8") as arquivo:
+            arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        return versao
+
+    def listar(self, host: str, caminho: str) -> list[dict]:
+        """Retorna as versões gravadas para host/caminho, da mais antiga para a mais recente."""
+        indice = self._caminho_indice(host, caminho)
+        if not indice.exists():
+            return []
+        with open(indice, encoding="utf-8") as arquivo:
+            return [json.loads(linha) for linha in arquivo if linha.strip()]
+
+    def restaurar(self, host: str, caminho: str, versao: str = None) -> str:
+        """Retorna o conteúdo de uma versão (aceita prefixo do identificador); sem versão, a mais recente."""
+        historico = self.listar(host, caminho)
+        if not historico:
+            raise Exception(f"Nenhum snapshot encontrado para {host}:{caminho}")
+        if versao is None:
+            escolhida = historico[-1]["versao"]
+        else:
+            candidatas = {r["versao"] for r in historico if r["versao"].startswith(versao)}
+            if len(candidatas) != 1:
+                raise ValueError(f"Versão '{versao}' não encontrada ou ambígua para {host}:{caminho}")
+            escolhida = candidatas.pop()
+        return b"".join(self._ler_arvore(escolhida)).decode("utf-8")
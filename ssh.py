@@ -1,14 +1,22 @@
 
+import base64
 import os
+import shlex
 from dotenv import load_dotenv
 import paramiko
+from paramiko.ssh_exception import NoValidConnectionsError
 from getpass import getpass
 import re
 
+from perfil import etapa, ativar_se_solicitado
 from main import generate_commands, get_template_paths, get_interactive_placeholder_data
+from snapshots import RepositorioSnapshots
+from armazenamento import BackendArmazenamento, sha256_conteudo
+from auditoria import LogAuditoria
 
 load_dotenv()
 
+@etapa("conexao_ssh")
 def conectar_ssh(host: str = None, usuario: str = None, senha: str = None):
  
     # Prioriza argumentos passados; se ausentes, usa variáveis do ambiente
@@ -23,23 +31,34 @@ def conectar_ssh(host: str = None, usuario: str = None, senha: str = None):
     client.load_system_host_keys()
     client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
+    # Os tipos do Paramiko são preservados para que quem chama (ex: agendador.py) consiga distinguir
+    # credenciais/chave inválidas, que não devem ser repetidas, de recusas temporárias do servidor.
     try:
         client.connect(host, username=usuario, password=senha)
         sftp = client.open_sftp()
         return client, sftp
     except paramiko.BadHostKeyException:
-        raise Exception("Chave do servidor não é confiável ou não pôde ser verificada.")
-    except paramiko.AuthenticationException:
-        raise Exception("Falha de autenticação. Verifique usuário e senha.")
+        client.close()
+        raise
+    except paramiko.AuthenticationException as auth_err:
+        client.close()
+        raise paramiko.AuthenticationException("Falha de autenticação. Verifique usuário e senha.") from auth_err
     except paramiko.SSHException as ssh_err:
-        raise Exception(f"Erro na conexão SSH: {ssh_err}")
+        client.close()
+        raise paramiko.SSHException(f"Erro na conexão SSH: {ssh_err}") from ssh_err
+    except (ConnectionResetError, NoValidConnectionsError):
+        client.close()
+        raise
     except Exception as err:
+        client.close()
         raise Exception(f"Erro ao conectar no host {host}: {err}")
 
-def execute_sudo_command(ssh_client, command, sudo_password):
+@etapa("sudo_exec")
+def execute_sudo_command(ssh_client, command, sudo_password, verbose: bool = True):
     """
     Executes a command with sudo privileges on the remote server.
     The sudo password is sent via stdin.
+    With verbose=False nothing is printed; the caller handles stdout/stderr/exit status.
     """
     try:
         chan = ssh_client.get_transport().open_session()
@@ -52,17 +71,23 @@ def execute_sudo_command(ssh_client, command, sudo_password):
         stderr = chan.makefile_stderr("rb", -1).read().decode().strip()
         exit_status = chan.recv_exit_status()
 
-        if exit_status == 0:
-            print(f"Comando SUDO '{command}' executado com sucesso.")
-            print(f"Saída:\n{stdout}")
-        else:
-            print(f"Comando SUDO '{command}' falhou com código {exit_status}.")
-            print(f"Erro:\n{stderr}")
+        if verbose:
+            if exit_status == 0:
+                print(f"Comando SUDO '{command}' executado com sucesso.")
+                print(f"Saída:\n{stdout}")
+            else:
+                print(f"Comando SUDO '{command}' falhou com código {exit_status}.")
+                print(f"Erro:\n{stderr}")
         return stdout, stderr, exit_status
+    except paramiko.ChannelException:
+        # Servidor recusou abrir o canal (MaxSessions): deixa passar para quem controla a concorrência
+        raise
     except Exception as e:
-        print(f"Erro ao executar comando SUDO: {e}")
+        if verbose:
+            print(f"Erro ao executar comando SUDO: {e}")
         return "", str(e), 1
 
+@etapa("sftp_leitura")
 def ler_arquivo_remoto(sftp, caminho_remoto: str) -> str:
     """Lê o conteúdo de um arquivo de texto no servidor remoto via SFTP."""
     try:
@@ -79,6 +104,17 @@ def ler_arquivo_remoto(sftp, caminho_remoto: str) -> str:
         # Qualquer outro erro ao ler o arquivo (permissão negada, etc.)
         raise Exception(f"Erro ao ler o arquivo remoto: {err}")
 
+def ler_arquivo_remoto_sudo(ssh_client, caminho_remoto: str, sudo_password: str) -> str:
+    """Lê o arquivo remoto com sudo (para arquivos que o usuário SSH não pode ler via SFTP).
+    O conteúdo trafega em base64 para preservar espaços e quebras de linha do início e do fim."""
+    stdout, stderr, exit_status = execute_sudo_command(
+        ssh_client, f"base64 -- {shlex.quote(caminho_remoto)}", sudo_password, verbose=False
+    )
+    if exit_status != 0:
+        raise Exception(f"Erro ao ler o arquivo remoto: {stderr}")
+    return base64.b64decode(stdout).decode("utf-8")
+
+@etapa("inserir_entrada_em_grupo")
 def inserir_entrada_em_grupo(conteudo: str, nome_grupo: str, nova_entrada: str) -> str:
     """Insere a nova_entrada dentro da seção/grupo especificado pelo nome_grupo no conteúdo fornecido."""
     linhas = conteudo.splitlines()
@@ -111,6 +147,7 @@ def inserir_entrada_em_grupo(conteudo: str, nome_grupo: str, nova_entrada: str)
     conteudo_modificado = "\n".join(linhas) + "\n"
     return conteudo_modificado
 
+@etapa("sftp_escrita")
 def salvar_arquivo_remoto(sftp, caminho_remoto: str, conteudo: str):
     """Escreve o conteúdo (texto) no arquivo remoto especificado, via SFTP."""
     try:
@@ -123,17 +160,61 @@ def salvar_arquivo_remoto(sftp, caminho_remoto: str, conteudo: str):
         # Possíveis erros: falta de permissão de escrita, espaço insuficiente, etc.
         raise Exception(f"Erro ao salvar o arquivo remoto: {err}")
 
+def sha256_arquivo_remoto(ssh_client, caminho_remoto: str, sudo_password: str) -> str:
+    """Calcula o SHA-256 do arquivo no servidor com um `sha256sum` remoto, sem baixá-lo."""
+    stdout, stderr, exit_status = execute_sudo_command(
+        ssh_client, f"sha256sum -- {shlex.quote(caminho_remoto)}", sudo_password, verbose=False
+    )
+    if exit_status != 0:
+        raise Exception(f"Erro ao calcular o checksum do arquivo remoto: {stderr}")
+    # Saída do sha256sum: "<hash>  <caminho>"
+    return stdout.split()[0].lower() if stdout else ""
+
+class BackendSFTP(BackendArmazenamento):
+    """Acesso ao arquivo no coletor remoto via SFTP; o checksum é calculado no servidor com sudo."""
+
+    def __init__(self, ssh_client, sftp, sudo_password: str):
+        self.ssh_client = ssh_client
+        self.sftp = sftp
+        self.sudo_password = sudo_password
+
+    def ler(self, caminho: str) -> str:
+        return ler_arquivo_remoto(self.sftp, caminho)
+
+    def salvar(self, caminho: str, conteudo: str):
+        salvar_arquivo_remoto(self.sftp, caminho, conteudo)
+
+    def inserir_entrada(self, caminho: str, nome_grupo: str, nova_entrada: str,
+                        antes_de_gravar=None) -> str:
+        """Lê, insere e regrava o arquivo inteiro; retorna o SHA-256 do conteúdo gravado."""
+        conteudo_original = self.ler(caminho)
+        conteudo_modificado = inserir_entrada_em_grupo(conteudo_original, nome_grupo, nova_entrada)
+        if antes_de_gravar:
+            antes_de_gravar(conteudo_original)
+        self.salvar(caminho, conteudo_modificado)
+        return sha256_conteudo(conteudo_modificado)
+
+    def sha256(self, caminho: str) -> str:
+        return sha256_arquivo_remoto(self.ssh_client, caminho, self.sudo_password)
+
 # Exemplo de uso do script:
 if __name__ == "__main__":
+    ativar_se_solicitado()
     print("\n--- Configurações de Conexão SSH ---")
     host = input("Host do servidor: ").strip()
     usuario = input("Usuário SSH: ").strip()
     senha = getpass("Senha SSH: ")
 
+    from recarga import RecarregadorOxidized, eh_router_db
+
     ssh_client = None
     sftp_client = None
+    recarregador = RecarregadorOxidized()
+    snapshots = RepositorioSnapshots()
+    auditoria = LogAuditoria()
     try:
         ssh_client, sftp_client = conectar_ssh(host, usuario, senha)
+        backend = BackendSFTP(ssh_client, sftp_client, senha)
         print(f"Conectado com sucesso a {host}.\n")
 
         while True:
@@ -141,7 +222,8 @@ if __name__ == "__main__":
             print("1) Gerar e inserir entradas em arquivo de configuração (via main.py)")
             print("2) Executar comando com SUDO")
             print("3) Inserir linha em arquivo remoto (programaticamente)")
-            print("4) Sair")
+            print("4) Restaurar versão anterior de arquivo remoto")
+            print("5) Sair")
             choice = input("Sua escolha: ").strip()
 
             if choice == '1':
@@ -205,10 +287,17 @@ if __name__ == "__main__":
 
                 confirm = input("\nConfirmar inserção destas entradas no servidor? [S/N]: ").strip().lower()
                 if confirm == 's':
-                    conteudo_original = ler_arquivo_remoto(sftp_client, caminho_config)
+                    conteudo_original = backend.ler(caminho_config)
                     conteudo_modificado = inserir_entrada_em_grupo(conteudo_original, nome_grupo, nova_entrada)
-                    salvar_arquivo_remoto(sftp_client, caminho_config, conteudo_modificado)
+                    snapshots.salvar(host, caminho_config, conteudo_original)
+                    backend.salvar(caminho_config, conteudo_modificado)
+                    if not backend.verificar(caminho_config, sha256_conteudo(conteudo_modificado)):
+                        print(f"ATENÇÃO: checksum do arquivo remoto não confere após a escrita: {caminho_config}")
+                        continue
                     print(f"Novas entradas inseridas no grupo '{nome_grupo}' e arquivo salvo com sucesso.")
+                    auditoria.registrar(host, caminho_config, nome_grupo, nova_entrada)
+                    if eh_router_db(caminho_config):
+                        recarregador.notificar_escrita(host, ssh_client, senha)
                 else:
                     print("Inserção cancelada.")
 
@@ -257,14 +346,58 @@ if __name__ == "__main__":
                 if sed_command:
                     confirm_insert = input(f"Confirmar execução do comando SED: '{sed_command}'? [S/N]: ").strip().lower()
                     if confirm_insert == 's':
-                        execute_sudo_command(ssh_client, sed_command, senha)
+                        # Snapshot antes de alterar, lido com sudo como o próprio sed
+                        try:
+                            conteudo_atual = ler_arquivo_remoto_sudo(ssh_client, remote_file, senha)
+                            snapshots.salvar(host, remote_file, conteudo_atual)
+                        except Exception as err:
+                            print(f"Não foi possível salvar o snapshot de {remote_file}: {err}")
+                            print("Inserção de linha cancelada.")
+                            continue
+                        _, _, rc = execute_sudo_command(ssh_client, sed_command, senha)
                         print("Operação de inserção de linha concluída (via SED).")
+                        # Só o router.db é lido pelo Oxidized; outros arquivos não justificam reiniciá-lo
+                        if rc == 0 and eh_router_db(remote_file):
+                            recarregador.notificar_escrita(host, ssh_client, senha)
                     else:
                         print("Inserção de linha cancelada.")
                 else:
                     print("Não foi possível construir o comando SED. Retornando ao menu.")
 
             elif choice == '4':
+                caminho_config = input("Caminho do arquivo remoto a restaurar: ").strip()
+                versoes = snapshots.listar(host, caminho_config)
+                if not versoes:
+                    print("Nenhuma versão salva para este arquivo. Retornando ao menu.")
+                    continue
+
+                print("\n--- Versões Salvas ---")
+                for i, v in enumerate(versoes, 1):
+                    print(f"{i}) {v['timestamp']}  {v['tamanho']} bytes  {v['versao'][:12]}")
+                try:
+                    versao_idx = int(input("Nº da versão a restaurar: ").strip()) - 1
+                    if not (0 <= versao_idx < len(versoes)):
+                        raise ValueError("Índice inválido.")
+                except ValueError:
+                    print("Escolha de versão inválida. Retornando ao menu.")
+                    continue
+
+                confirm = input(f"Confirmar restauração de {caminho_config} para a versão {versao_idx + 1}? [S/N]: ").strip().lower()
+                if confirm == 's':
+                    conteudo_restaurado = snapshots.restaurar(host, caminho_config, versoes[versao_idx]['versao'])
+                    # Guarda a versão atual antes de sobrescrever, para que a restauração possa ser desfeita
+                    snapshots.salvar(host, caminho_config, backend.ler(caminho_config))
+                    backend.salvar(caminho_config, conteudo_restaurado)
+                    if not backend.verificar(caminho_config, sha256_conteudo(conteudo_restaurado)):
+                        print(f"ATENÇÃO: checksum do arquivo remoto não confere após a escrita: {caminho_config}")
+                        continue
+                    print("Versão restaurada com sucesso.")
+                    if eh_router_db(caminho_config):
+                        recarregador.notificar_escrita(host, ssh_client, senha)
+                else:
+                    print("Restauração cancelada.")
+
+            elif choice == '5':
                 print("Saindo...")
                 break
             else:
@@ -273,6 +406,8 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"Erro geral: {e}")
     finally:
+        if ssh_client:
+            recarregador.fechar()
         if sftp_client:
             sftp_client.close()
         if ssh_client:
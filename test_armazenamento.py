@@ -0,0 +1,79 @@
+import hashlib
+import os
+
+import pytest
+
+from armazenamento import BackendLocal
+
+
+def _inserir(caminho, grupo, entrada):
+    sha256 = BackendLocal().inserir_entrada(str(caminho), grupo, entrada)
+    assert sha256 == hashlib.sha256(caminho.read_bytes()).hexdigest()
+    return caminho.read_bytes()
+
+
+def test_insere_no_fim_do_grupo_com_lf(tmp_path):
+    router_db = tmp_path / "router.db"
+    router_db.write_bytes(b"[BKP]\na:1.1.1.1\n[OUTRO]\nx:2.2.2.2\n")
+
+    assert _inserir(router_db, "bkp", "b:3.3.3.3") == b"[BKP]\na:1.1.1.1\nb:3.3.3.3\n[OUTRO]\nx:2.2.2.2\n"
+
+
+def test_mantem_crlf_do_arquivo(tmp_path):
+    router_db = tmp_path / "router.db"
+    router_db.write_bytes(b"[BKP]\r\na:1.1.1.1\r\n[OUTRO]\r\nx:2.2.2.2\r\n")
+
+    conteudo = _inserir(router_db, "BKP", "b:3.3.3.3\nc:4.4.4.4")
+    assert conteudo == b"[BKP]\r\na:1.1.1.1\r\nb:3.3.3.3\r\nc:4.4.4.4\r\n[OUTRO]\r\nx:2.2.2.2\r\n"
+
+
+def test_ultima_secao_sem_quebra_final(tmp_path):
+    router_db = tmp_path / "router.db"
+    router_db.write_bytes(b"[OUTRO]\r\nx:2.2.2.2\r\n[BKP]\r\na:1.1.1.1")
+
+    assert _inserir(router_db, "BKP", "b:3.3.3.3") == b"[OUTRO]\r\nx:2.2.2.2\r\n[BKP]\r\na:1.1.1.1\r\nb:3.3.3.3\r\n"
+
+
+def test_entrada_duplicada_nao_altera_o_arquivo(tmp_path):
+    router_db = tmp_path / "router.db"
+    router_db.write_bytes(b"[BKP]\na:1.1.1.1\n")
+
+    with pytest.raises(Exception, match="já existe"):
+        BackendLocal().inserir_entrada(str(router_db), "BKP", "a:1.1.1.1")
+    assert router_db.read_bytes() == b"[BKP]\na:1.1.1.1\n"
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="sem suporte a links simbólicos")
+def test_link_simbolico_altera_o_arquivo_real(tmp_path):
+    real = tmp_path / "real"
+    real.mkdir()
+    (real / "router.db").write_bytes(b"[BKP]\na:1.1.1.1\n")
+    link = tmp_path / "router.db"
+    link.symlink_to(real / "router.db")
+
+    BackendLocal().inserir_entrada(str(link), "BKP", "b:3.3.3.3")
+
+    assert link.is_symlink()
+    assert (real / "router.db").read_bytes() == b"[BKP]\na:1.1.1.1\nb:3.3.3.3\n"
+    assert sorted(p.name for p in real.iterdir()) == ["router.db", "router.db.lock"]
+
+
+def test_preserva_permissoes(tmp_path):
+    router_db = tmp_path / "router.db"
+    router_db.write_bytes(b"[BKP]\n")
+    router_db.chmod(0o640)
+
+    _inserir(router_db, "BKP", "a:1.1.1.1")
+    assert router_db.stat().st_mode & 0o777 == 0o640
+
+
+def test_antes_de_gravar_recebe_a_versao_substituida(tmp_path):
+    router_db = tmp_path / "router.db"
+    router_db.write_bytes(b"[BKP]\na:1.1.1.1\n")
+    versoes = []
+
+    BackendLocal().inserir_entrada(str(router_db), "BKP", "b:3.3.3.3", antes_de_gravar=versoes.append)
+    with pytest.raises(Exception, match="já existe"):
+        BackendLocal().inserir_entrada(str(router_db), "BKP", "b:3.3.3.3", antes_de_gravar=versoes.append)
+
+    assert versoes == ["[BKP]\na:1.1.1.1\n"]
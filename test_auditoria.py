@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+import auditoria as auditoria_modulo
+from auditoria import LogAuditoria
+
+
+def test_registro_truncado_nao_corrompe_registros_seguintes(tmp_path):
+    auditoria = LogAuditoria(tmp_path)
+    auditoria.registrar("coletor", "router.db", "BKP", "A:1.1.1.1:ios:G:22", "op")
+
+    # Simula uma escrita interrompida: cabeçalho e parte dos dados de um registro
+    completo = auditoria.caminho_log.read_bytes()
+    with open(auditoria.caminho_log, "ab") as log:
+        log.write(completo[: len(completo) - 5])
+
+    auditoria.registrar("coletor", "router.db", "BKP", "B:2.2.2.2:ios:G:22", "op")
+
+    exportado = tmp_path / "export.jsonl"
+    assert auditoria.exportar_jsonl(exportado) == 2
+    assert [r["entrada"] for r in auditoria.buscar("B")] == ["B:2.2.2.2:ios:G:22"]
+
+    auditoria.reconstruir_indice()
+    assert len(auditoria.buscar("B")) == 1
+    assert len(auditoria.buscar("2.2.2.2")) == 1
+    assert len(auditoria.buscar("A")) == 1
+
+
+def test_credenciais_da_entrada_nao_sao_gravadas(tmp_path):
+    auditoria = LogAuditoria(tmp_path)
+    auditoria.registrar("coletor", "router.db", "BKP", "MKT-X:10.0.0.1:routeros:G:22:admin:M1cr0S3t", "op")
+
+    assert auditoria.buscar("MKT-X")[0]["entrada"] == "MKT-X:10.0.0.1:routeros:G:22:***:***"
+    assert b"M1cr0S3t" not in auditoria.caminho_log.read_bytes()
+
+
+
+@pytest.mark.skipif(auditoria_modulo.fcntl is None, reason="sem flock nesta plataforma")
+def test_registrar_espera_a_reconstrucao_do_indice(tmp_path, monkeypatch):
+    auditoria = LogAuditoria(tmp_path)
+    auditoria.registrar("coletor", "router.db", "BKP", "A:1.1.1.1:ios:G:22", "op")
+    tamanho_durante = []
+    concorrente = threading.Thread(
+        target=auditoria.registrar, args=("coletor", "router.db", "BKP", "NOVO:10.9.9.9:ios:G:22", "op")
+    )
+    indexar = LogAuditoria._indexar
+
+    def indexar_com_concorrente(self, offset, entrada):
+        if concorrente.ident is None:
+            concorrente.start()
+            time.sleep(0.1)
+            tamanho_durante.append(auditoria.caminho_log.stat().st_size)
+        return indexar(self, offset, entrada)
+
+    tamanho_antes = auditoria.caminho_log.stat().st_size
+    monkeypatch.setattr(LogAuditoria, "_indexar", indexar_com_concorrente)
+    auditoria.reconstruir_indice()
+    concorrente.join()
+
+    assert tamanho_durante == [tamanho_antes]
+    assert len(auditoria.buscar("NOVO")) == 1
+    assert len(auditoria.buscar("A")) == 1